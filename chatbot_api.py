@@ -1,18 +1,91 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 from supabase import create_client
 import requests
-import json
+import httpx
+import asyncio
+import glob
+import hashlib
+import io
+import orjson
 import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+import tiktoken
 from pypdf import PdfReader
 
 load_dotenv(override=True)
 
+CHAT_MODEL = "gpt-4o-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_BATCH_SIZE = 2048  # OpenAI's max number of inputs per embeddings request
+EMBEDDING_CONCURRENCY = 5  # Max in-flight embedding requests (keeps us clear of 429s)
+EMBEDDING_CACHE_SIZE = 1024
+EMBEDDING_WAIT_TIMEOUT = 60  # Seconds to wait on an identical in-flight embedding request
+MATCH_THRESHOLD = 0.7  # Min cosine similarity for a chunk to count as relevant
+SEMANTIC_CACHE_THRESHOLD = 0.86  # Min cosine similarity to reuse a cached answer
+SEMANTIC_CACHE_SIZE = 512
+MAX_HISTORY_TURNS = 10  # User/assistant exchanges of history sent to the model
+MAX_HISTORY_TOKENS = 4000
+CHARS_PER_TOKEN = 4  # Rough token estimate when no tiktoken encoding is available
+# Short social messages that need neither retrieval nor the semantic cache
+GREETING_SET = {"hi", "hello", "hey", "thanks", "thank you", "ok", "bye"}
+
+SYSTEM_PROMPT_TEMPLATE = """You are acting as {name}, a Software Development Engineer. You are answering questions on {name}'s portfolio website, \
+particularly questions related to {name}'s career, background, skills, experience, and projects. \
+Your responsibility is to represent {name} for interactions on the website as faithfully as possible. \
+Be professional, engaging, and friendly, as if talking to a potential client, recruiter, or future employer who came across the website. \
+Keep your responses concise and to the point - aim for 2-3 sentences unless more detail is specifically requested. \
+If you don't know the answer to any question, use your record_unknown_question tool to record the question that you couldn't answer. \
+If the user is engaging in discussion and seems interested in collaboration or hiring, try to steer them towards getting in touch via email; ask for their email and record it using your record_user_details tool."""
+CLOSING_PROMPT_TEMPLATE = "With this context, please chat with the user, always staying in character as {name}. Be helpful, professional, and engaging!"
+RAG_CONTEXT_TEMPLATE = "\n\n## Retrieved Context:\n{context}"
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (used by jsonify and request.json)"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)  # Enable CORS for React frontend
 
+# Background pool for writes/notifications the user doesn't need to wait on
+_io_pool = ThreadPoolExecutor(max_workers=2)
+
+
+def _log_background_error(future):
+    if future.exception() is not None:
+        print(f"⚠ Background task failed: {future.exception()!r}")
+
+
+def _run_in_background(fn, *args, **kwargs):
+    """Run fn on the background pool; nobody waits on the result, so failures are logged here"""
+    future = _io_pool.submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_background_error)
+    return future
+
+# Shared keep-alive connection pools, so TLS handshakes are paid once rather than per request
+_openai_http_client = httpx.Client(
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=100)
+)
+_pushover_session = requests.Session()
+
 
 def push(text: str):
     token = os.getenv("PUSHOVER_TOKEN")
@@ -23,7 +96,7 @@ def push(text: str):
         return
 
     try:
-        requests.post(
+        _pushover_session.post(
             "https://api.pushover.net/1/messages.json",
             data={"token": token, "user": user, "message": text},
             timeout=5
@@ -32,12 +105,56 @@ def push(text: str):
         # Don't crash the request just because notifications failed
         print(f"⚠ Pushover push failed: {e}")
 
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model):
+    """Return the tiktoken encoding for model, loaded once per process; None if it can't be loaded yet"""
+    encoding = _encodings.get(model)
+    if encoding is not None:
+        return encoding
+    # The first load downloads the BPE ranks. The lock stops concurrent callers from each
+    # downloading them, and only successes are kept, so a transient failure is retried
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                print(f"⚠ Could not load tiktoken encoding for {model}: {e}")
+                return None
+        return _encodings[model]
+
+
+def top_k(sims, k):
+    """Return (indices, similarities) of the k highest similarities, best first"""
+    # argpartition finds the top k in O(n); only those k get sorted
+    k = min(k, len(sims))
+    idx = np.argpartition(-sims, k - 1)[:k]
+    idx = idx[np.argsort(-sims[idx])]
+    return idx, sims[idx]
+
+
+def topk_cosine(matrix, query, k):
+    """Return (indices, similarities) of the k best rows, best first; rows and query must be L2-normalized"""
+    return top_k(matrix @ query, k)
+
+
 class RAGRetriever:
     """Handles vector embeddings and similarity search"""
     
     def __init__(self, openai_client, supabase_client):
         self.openai = openai_client
         self.supabase = supabase_client
+        # In-memory copy of the vector store; the corpus is small enough to rank locally
+        self.contents = []
+        self.index = None  # int8-quantized, L2-normalized embeddings (one row per chunk)
+        self.index_scales = None  # Per-row quantization scale
+        # Exact-match embedding cache (LRU) and requests currently in flight, keyed by text hash
+        self._embed_cache = OrderedDict()
+        self._embed_inflight = {}
+        self._embed_lock = threading.Lock()
     
     def is_initialized(self):
         """Check if documents are already embedded"""
@@ -48,26 +165,102 @@ class RAGRetriever:
             return False
     
     def generate_embedding(self, text):
-        """Generate embedding using OpenAI"""
-        response = self.openai.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"
-        )
-        return response.data[0].embedding
+        """Generate embedding using OpenAI; identical concurrent or repeated texts share one request"""
+        key = hashlib.sha1(text.encode()).digest()
+        with self._embed_lock:
+            if key in self._embed_cache:
+                self._embed_cache.move_to_end(key)
+                return self._embed_cache[key]
+            future = self._embed_inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._embed_inflight[key] = future
+        
+        # Someone else is already embedding this text - wait for their result
+        if not is_owner:
+            return future.result(timeout=EMBEDDING_WAIT_TIMEOUT)
+        
+        try:
+            response = self.openai.embeddings.create(
+                input=text,
+                model=EMBEDDING_MODEL
+            )
+            embedding = response.data[0].embedding
+        except BaseException as e:
+            # BaseException too: a gevent Timeout/GreenletExit must not leave waiters hanging.
+            # Waiters get a plain Exception so they don't kill their own greenlet.
+            with self._embed_lock:
+                del self._embed_inflight[key]
+            future.set_exception(e if isinstance(e, Exception)
+                                 else RuntimeError(f"Embedding request aborted: {e!r}"))
+            raise
+        
+        with self._embed_lock:
+            self._embed_cache[key] = embedding
+            if len(self._embed_cache) > EMBEDDING_CACHE_SIZE:
+                self._embed_cache.popitem(last=False)
+            del self._embed_inflight[key]
+        future.set_result(embedding)
+        return embedding
+    
+    def generate_embeddings_batch(self, texts):
+        """Generate embeddings for many texts in as few requests as possible"""
+        if not texts:
+            return []
+        return asyncio.run(self._generate_embeddings_async(texts))
     
-    def chunk_text(self, text, source, chunk_size=500):
-        """Split text into semantic chunks"""
-        sections = [s.strip() for s in text.split('\n\n') if s.strip()]
-        chunks = []
+    async def _generate_embeddings_async(self, texts):
+        """Embed sub-batches concurrently, preserving input order"""
+        batches = [texts[start:start + EMBEDDING_BATCH_SIZE]
+                   for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
         
-        for i, section in enumerate(sections):
-            if len(section) > 50:  # Minimum chunk size
-                chunks.append({
-                    'content': section,
-                    'metadata': {'source': source, 'chunk_id': i}
-                })
+        # The async client is scoped to this event loop (asyncio.run creates a new one each call);
+        # it mirrors the sync client's settings so seeding behaves like every other OpenAI call
+        async with AsyncOpenAI(
+            api_key=self.openai.api_key,
+            organization=self.openai.organization,
+            base_url=self.openai.base_url,
+            timeout=self.openai.timeout,
+            max_retries=self.openai.max_retries
+        ) as client:
+            async def embed(batch):
+                async with semaphore:
+                    response = await client.embeddings.create(
+                        input=batch,
+                        model=EMBEDDING_MODEL
+                    )
+                return [d.embedding for d in response.data]
+            
+            # gather() returns results in the order the batches were passed in
+            results = await asyncio.gather(*(embed(batch) for batch in batches))
+        
+        return [embedding for batch in results for embedding in batch]
+    
+    def chunk_text(self, text, source, chunk_size=500, by_tokens=False, overlap=50):
+        """Split text into semantic chunks (paragraphs), or overlapping token windows if by_tokens"""
+        if by_tokens:
+            return self._chunk_by_tokens(text, source, chunk_size, overlap)
         
-        return chunks
+        sections = [s for s in (p.strip() for p in re.split(r'\n\s*\n', text)) if len(s) > 50]  # Minimum chunk size
+        return [{'content': s, 'metadata': {'source': source, 'chunk_id': i}}
+                for i, s in enumerate(sections)]
+    
+    def _chunk_by_tokens(self, text, source, chunk_size, overlap):
+        """Split text into windows of chunk_size tokens, each overlapping the previous by overlap"""
+        encoding = get_encoding(EMBEDDING_MODEL)
+        if encoding is None:
+            print("⚠ Token chunking unavailable, falling back to paragraph chunks")
+            return self.chunk_text(text, source)
+        tokens = encoding.encode_ordinary(text)
+        if not tokens:
+            return []
+        step = max(chunk_size - overlap, 1)
+        starts = range(0, max(len(tokens) - overlap, 1), step)
+        return [{'content': encoding.decode(tokens[start:start + chunk_size]),
+                 'metadata': {'source': source, 'chunk_id': i}}
+                for i, start in enumerate(starts)]
     
     def embed_documents(self, resume, summary):
         """Chunk and embed documents into vector store"""
@@ -76,26 +269,75 @@ class RAGRetriever:
         
         print(f"Embedding {len(chunks)} document chunks...")
         
-        for chunk in chunks:
-            embedding = self.generate_embedding(chunk['content'])
-            self.supabase.table('documents').insert({
+        texts = [chunk['content'] for chunk in chunks]
+        embeddings = self.generate_embeddings_batch(texts)
+        
+        # One bulk insert instead of a round-trip per chunk
+        rows = [
+            {
                 'content': chunk['content'],
                 'metadata': chunk['metadata'],
                 'embedding': embedding
-            }).execute()
+            }
+            for chunk, embedding in zip(chunks, embeddings)
+        ]
+        if rows:
+            self.supabase.table('documents').insert(rows).execute()
         
         print(f"✓ Embedded {len(chunks)} chunks successfully")
     
-    def retrieve_context(self, query, top_k=3):
+    def load_index(self):
+        """Load all document embeddings into memory for local similarity search"""
+        try:
+            rows = self.supabase.table('documents').select('content,embedding').execute().data
+            # PostgREST returns pgvector columns as their text form, e.g. "[0.1,0.2,...]"
+            embeddings = [orjson.loads(r['embedding']) if isinstance(r['embedding'], str) else r['embedding']
+                          for r in rows]
+            if not embeddings:
+                return
+            index = np.array(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(index, axis=1, keepdims=True)
+            self.index, self.index_scales = self._quantize(index / np.where(norms == 0, 1, norms))
+            self.contents = [r['content'] for r in rows]
+            print(f"✓ Loaded {len(self.contents)} chunks into local vector index")
+        except Exception as e:
+            print(f"⚠ Could not load local vector index, falling back to Supabase search: {e}")
+            self.index = None
+    
+    @staticmethod
+    def _quantize(vectors):
+        """Quantize float vectors to int8 with a per-vector scale (4x smaller than float32)"""
+        max_abs = np.abs(vectors).max(axis=-1, keepdims=True)
+        scales = 127 / np.where(max_abs == 0, 1, max_abs)
+        return np.round(vectors * scales).astype(np.int8), scales.squeeze(-1).astype(np.float32)
+    
+    def _search_index(self, query_embedding, k):
+        """Rank chunks by cosine similarity against the in-memory index"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query, query_scale = self._quantize(query / (np.linalg.norm(query) or 1))
+        
+        # Integer dot products (int32 accumulators can't overflow at 1536 dims), then undo
+        # both scales to get approximate cosine similarities. einsum casts in buffered
+        # chunks, so the int8 index is never copied whole to int32
+        sims = np.einsum('ij,j->i', self.index, query, dtype=np.int32) / (self.index_scales * query_scale)
+        
+        idx, top_sims = top_k(sims, k)
+        return [self.contents[i] for i, sim in zip(idx, top_sims) if sim > MATCH_THRESHOLD]
+    
+    def retrieve_context(self, query, top_k=3, query_embedding=None):
         """Retrieve most relevant chunks using vector similarity"""
         try:
-            query_embedding = self.generate_embedding(query)
+            if query_embedding is None:
+                query_embedding = self.generate_embedding(query)
+            
+            if self.index is not None:
+                return self._search_index(query_embedding, top_k)
             
             response = self.supabase.rpc(
                 'match_documents',
                 {
                     'query_embedding': query_embedding,
-                    'match_threshold': 0.7,
+                    'match_threshold': MATCH_THRESHOLD,
                     'match_count': top_k
                 }
             ).execute()
@@ -106,6 +348,63 @@ class RAGRetriever:
             return []
 
 
+class SemanticCache:
+    """Bounded LRU cache of chat responses keyed by query embedding"""
+    
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, capacity=SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.capacity = capacity
+        # Normalized embeddings live in a preallocated matrix (allocated on first add);
+        # rows [0, size) are filled, and hits/evictions never move them
+        self._matrix = None
+        self._responses = [None] * capacity
+        self._last_used = np.zeros(capacity, dtype=np.int64)  # Logical clock per row, for LRU eviction
+        self._clock = 0
+        self.size = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _touch(self, row):
+        self._clock += 1
+        self._last_used[row] = self._clock
+    
+    def lookup(self, embedding):
+        """Return the cached response for a near-duplicate query, or None"""
+        query = self._normalize(embedding)
+        with self._lock:
+            if not self.size:
+                return None
+            
+            # Embeddings are stored normalized, so dot products are cosine similarities
+            idx, sims = topk_cosine(self._matrix[:self.size], query, 1)
+            best = int(idx[0])
+            if sims[0] < self.threshold:
+                return None
+            
+            self._touch(best)
+            return self._responses[best]
+    
+    def add(self, embedding, response):
+        """Cache a response; evicts the least recently used entry when full"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+            if self.size < self.capacity:
+                row = self.size
+                self.size += 1
+            else:
+                row = int(self._last_used.argmin())
+            self._matrix[row] = vector
+            self._responses[row] = response
+            self._touch(row)
+
+
 class ConversationStore:
     """Handles SQL database operations for conversations and leads"""
     
@@ -153,8 +452,44 @@ class ConversationStore:
 
 
 class AdityaChatbot:
+    # Tool schemas offered to the model on every completion
+    _TOOLS = [
+        {
+            "type": "function",
+            "function": {
+                "name": "record_user_details",
+                "description": "Record user contact details when they're interested in getting in touch",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "email": {"type": "string", "description": "User's email"},
+                        "name": {"type": "string", "description": "User's name"},
+                        "notes": {"type": "string", "description": "Conversation context"}
+                    },
+                    "required": ["email"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "record_unknown_question",
+                "description": "Record questions that couldn't be answered",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "question": {"type": "string", "description": "The unanswered question"}
+                    },
+                    "required": ["question"],
+                    "additionalProperties": False
+                }
+            }
+        }
+    ]
+
     def __init__(self):
-        self.openai = OpenAI()
+        self.openai = OpenAI(http_client=_openai_http_client)
         self.name = "Aditya Mazumdar"
 
         # Try to initialize Supabase (optional)
@@ -176,7 +511,6 @@ class AdityaChatbot:
                 test_result = self.supabase.table('documents').select('id').limit(1).execute()
 
                 # If we get here, connection works
-                self.rag = RAGRetriever(self.openai, self.supabase)
                 self.db = ConversationStore(self.supabase)
                 self.supabase_enabled = True
                 print("✓ Supabase connected successfully")
@@ -186,32 +520,98 @@ class AdityaChatbot:
             print(f"⚠ Supabase connection failed - running without it")
             self.supabase_enabled = False
 
+        # Retriever is always available for query embeddings; vector search needs Supabase
+        self.rag = RAGRetriever(self.openai, self.supabase if self.supabase_enabled else None)
+        self.semantic_cache = SemanticCache()
+
         # Load documents
         self.resume = self._load_resume()
         self.summary = self._load_summary()
+        self._static_prompt = self._build_static_prompt()
 
-        # Initialize vector database if Supabase is enabled
+        # Load the vector index if Supabase is enabled. Startup only reads: every web
+        # worker runs this, so seeding an empty store is left to seed_vector_db()
         if self.supabase_enabled:
-            if not self.rag.is_initialized():
-                print("Initializing vector database...")
-                self.rag.embed_documents(self.resume, self.summary)
-            else:
+            if self.rag.is_initialized():
                 print("✓ Vector database already initialized")
+                self.rag.load_index()
+            else:
+                print("⚠ Vector database is empty - run `python chatbot_api.py --seed` to embed documents")
         else:
             print("✓ Chatbot ready (without Supabase features)")
+
+        self._warm_up()
+    
+    def seed_vector_db(self):
+        """Embed documents into the vector database if it is empty (run once, not per worker)"""
+        if not self.supabase_enabled:
+            print("⚠ Supabase not configured - nothing to seed")
+            return
+        if self.rag.is_initialized():
+            print("✓ Vector database already initialized")
+            return
+        print("Initializing vector database...")
+        self.rag.embed_documents(self.resume, self.summary)
+        self.rag.load_index()
+    
+    def _warm_up(self):
+        """Open a connection to the OpenAI API now so the first user doesn't pay for it"""
+        # Supabase needs no warm-up: startup already queried it above.
+        # Embeddings and chat share one host and one connection pool, so a free
+        # model lookup opens the TLS session without billing a request per worker
+        try:
+            self.openai.models.retrieve(CHAT_MODEL)
+            print("✓ OpenAI connection warmed up")
+        except Exception as e:
+            print(f"⚠ OpenAI warm-up failed: {e}")
+
+        # History trimming needs the chat model's tokenizer; loading it can mean a download
+        get_encoding(CHAT_MODEL)
     
     def _load_resume(self):
-        """Load resume from PDF"""
+        """Load resume from PDF, reusing previously extracted text when the PDF is unchanged"""
         try:
             # Use path relative to this script's location
             base_dir = os.path.dirname(os.path.abspath(__file__))
             resume_path = os.path.join(base_dir, "Resume.pdf")
-            reader = PdfReader(resume_path)
-            resume = ""
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    resume += text
+
+            # Sidecar cache keyed by mtime + size, so replacing the PDF invalidates it
+            stat = os.stat(resume_path)
+            cache_path = f"{resume_path}.{stat.st_mtime_ns}.{stat.st_size}.txt"
+            if os.path.exists(cache_path):
+                try:
+                    with open(cache_path, "r", encoding="utf-8") as f:
+                        return f.read()
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"⚠ Could not read cached resume text, re-parsing PDF: {e}")
+
+            with open(resume_path, "rb") as f:
+                pdf_bytes = f.read()
+            page_count = len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+            def extract_page(page_number):
+                # Each worker gets its own reader; a shared one would race on the stream position
+                return PdfReader(io.BytesIO(pdf_bytes)).pages[page_number].extract_text() or ""
+
+            # Pages are independent, so extract them concurrently (map keeps page order)
+            with ThreadPoolExecutor(max_workers=max(1, min(4, page_count))) as pool:
+                resume = "".join(pool.map(extract_page, range(page_count)))
+
+            try:
+                # Write-then-rename so a crash never leaves a truncated cache behind
+                # (per-process temp name, since several workers may boot at once)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(resume)
+                os.replace(tmp_path, cache_path)
+
+                # Drop caches left behind by previous versions of the PDF
+                for stale_path in glob.glob(glob.escape(resume_path) + ".*.txt"):
+                    if stale_path != cache_path:
+                        os.remove(stale_path)
+            except OSError as e:
+                # Read-only filesystem etc. - just parse again next boot
+                print(f"⚠ Could not cache resume text: {e}")
             return resume
         except Exception as e:
             print(f"Error reading Resume.pdf: {e}")
@@ -229,57 +629,9 @@ class AdityaChatbot:
             print(f"Error reading summary.txt: {e}")
             return ""
     
-    def _get_tools(self):
-        """Define available tools"""
-        return [
-            {
-                "type": "function",
-                "function": {
-                    "name": "record_user_details",
-                    "description": "Record user contact details when they're interested in getting in touch",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "email": {"type": "string", "description": "User's email"},
-                            "name": {"type": "string", "description": "User's name"},
-                            "notes": {"type": "string", "description": "Conversation context"}
-                        },
-                        "required": ["email"],
-                        "additionalProperties": False
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "record_unknown_question",
-                    "description": "Record questions that couldn't be answered",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "question": {"type": "string", "description": "The unanswered question"}
-                        },
-                        "required": ["question"],
-                        "additionalProperties": False
-                    }
-                }
-            }
-        ]
-    
-    def _build_system_prompt(self, rag_context):
-        """Build system prompt with RAG context"""
-        base_prompt = f"""You are acting as {self.name}, a Software Development Engineer. You are answering questions on {self.name}'s portfolio website, \
-particularly questions related to {self.name}'s career, background, skills, experience, and projects. \
-Your responsibility is to represent {self.name} for interactions on the website as faithfully as possible. \
-Be professional, engaging, and friendly, as if talking to a potential client, recruiter, or future employer who came across the website. \
-Keep your responses concise and to the point - aim for 2-3 sentences unless more detail is specifically requested. \
-If you don't know the answer to any question, use your record_unknown_question tool to record the question that you couldn't answer. \
-If the user is engaging in discussion and seems interested in collaboration or hiring, try to steer them towards getting in touch via email; ask for their email and record it using your record_user_details tool."""
-        
-        # Add RAG context if available
-        if rag_context:
-            context_section = "\n\n## Retrieved Context:\n" + "\n\n".join(rag_context)
-            base_prompt += context_section
+    def _build_static_prompt(self):
+        """Build the per-process constant part of the system prompt"""
+        base_prompt = SYSTEM_PROMPT_TEMPLATE.format(name=self.name)
         
         # Add full resume and summary as fallback
         if self.summary:
@@ -287,30 +639,40 @@ If the user is engaging in discussion and seems interested in collaboration or h
         if self.resume:
             base_prompt += f"## Resume:\n{self.resume}\n\n"
         
-        base_prompt += f"With this context, please chat with the user, always staying in character as {self.name}. Be helpful, professional, and engaging!"
+        base_prompt += CLOSING_PROMPT_TEMPLATE.format(name=self.name)
         
         return base_prompt
     
+    def _build_system_prompt(self, rag_context):
+        """Build system prompt with RAG context"""
+        # Retrieved context goes last so the long static prefix is identical across
+        # requests and eligible for OpenAI's automatic prompt caching
+        if rag_context:
+            return self._static_prompt + RAG_CONTEXT_TEMPLATE.format(context="\n\n".join(rag_context))
+        return self._static_prompt
+    
     def _handle_tool_calls(self, tool_calls, user_id):
         """Handle tool execution"""
         results = []
         for tool_call in tool_calls:
             tool_name = tool_call.function.name
-            arguments = json.loads(tool_call.function.arguments)
+            arguments = orjson.loads(tool_call.function.arguments)
             print(f"Tool called: {tool_name}", flush=True)
 
             # Route to appropriate tool handler
             if tool_name == "record_user_details":
-                push(f"Lead: name={arguments.get('name','')} email={arguments.get('email')} notes={arguments.get('notes','')}")
+                _run_in_background(push, f"Lead: name={arguments.get('name','')} email={arguments.get('email')} notes={arguments.get('notes','')}")
                 if self.supabase_enabled:
-                    result = self.db.record_user_details(user_id, **arguments)
+                    _run_in_background(self.db.record_user_details, user_id, **arguments)
+                    result = {"recorded": "ok", "email": arguments.get('email')}
                 else:
                     print(f"📧 Lead captured: {arguments}")
                     result = {"recorded": "ok", "note": "Logged locally (Supabase disabled)"}
             elif tool_name == "record_unknown_question":
-                push(f"❓ Unknown question: {arguments.get('question')}")
+                _run_in_background(push, f"❓ Unknown question: {arguments.get('question')}")
                 if self.supabase_enabled:
-                    result = self.db.record_unknown_question(**arguments)
+                    _run_in_background(self.db.record_unknown_question, **arguments)
+                    result = {"recorded": "ok"}
                 else:
                     print(f"❓ Unknown question: {arguments.get('question')}")
                     result = {"recorded": "ok", "note": "Logged locally (Supabase disabled)"}
@@ -319,48 +681,175 @@ If the user is engaging in discussion and seems interested in collaboration or h
 
             results.append({
                 "role": "tool",
-                "content": json.dumps(result),
+                "content": orjson.dumps(result).decode(),
                 "tool_call_id": tool_call.id
             })
 
         return results
     
-    def chat(self, message, history, user_id="anonymous"):
-        """Main chat function with RAG and tool calling"""
+    def _trim_history(self, history):
+        """Keep only the most recent history that fits the turn and token limits"""
+        if not history:
+            return []
+        history = history[-MAX_HISTORY_TURNS * 2:]
+        encoding = get_encoding(CHAT_MODEL)
+        
+        def count_tokens(text):
+            if encoding is None:
+                return len(text) // CHARS_PER_TOKEN + 1
+            return len(encoding.encode_ordinary(text))
+        
+        token_counts = [count_tokens(str(m.get('content') or '')) for m in history]
+        
+        # Drop the oldest messages until the rest fit the budget
+        total = sum(token_counts)
+        start = 0
+        while total > MAX_HISTORY_TOKENS and start < len(history):
+            total -= token_counts[start]
+            start += 1
+        return history[start:]
+    
+    def _prepare_chat(self, message, history, user_id):
+        """Return (cached_response, messages, cache_key) for a turn; cache_key is None if the answer shouldn't be cached"""
+        # Greetings/chit-chat skip the embedding, the cache and RAG entirely
+        normalized = message.strip().lower().rstrip('!?.')
+        is_small_talk = len(message.strip()) < 8 or normalized in GREETING_SET
+
+        # Semantic cache: only conversation openers, since follow-ups depend on history
+        query_embedding = None
+        use_cache = not history and not is_small_talk
+        if use_cache:
+            try:
+                query_embedding = self.rag.generate_embedding(message)
+            except Exception as e:
+                print(f"Query embedding error: {e}")
+                use_cache = False
+        if use_cache:
+            cached_response = self.semantic_cache.lookup(query_embedding)
+            if cached_response is not None:
+                if self.supabase_enabled:
+                    _run_in_background(self.db.save_conversation, user_id, message, cached_response, {'cached': True})
+                return cached_response, None, None
+
         # RAG: Retrieve relevant context (if Supabase enabled)
         relevant_chunks = []
-        if self.supabase_enabled:
-            relevant_chunks = self.rag.retrieve_context(message, top_k=3)
+        if self.supabase_enabled and not is_small_talk:
+            relevant_chunks = self.rag.retrieve_context(message, top_k=3, query_embedding=query_embedding)
 
         # Build messages with RAG context
         messages = [{"role": "system", "content": self._build_system_prompt(relevant_chunks)}]
-        messages.extend(history)
+        messages.extend(self._trim_history(history))
         messages.append({"role": "user", "content": message})
 
+        return None, messages, query_embedding if use_cache else None
+    
+    def _finish_chat(self, message, final_response, user_id, cache_key, used_tools, complete=True):
+        """Cache and store a turn; an incomplete (interrupted) reply is stored but never cached"""
+        # Don't cache turns with side effects (leads, unknown questions) - a hit would skip them
+        if complete and cache_key is not None and not used_tools and final_response:
+            self.semantic_cache.add(cache_key, final_response)
+
+        # Store conversation in database in the background (if Supabase enabled)
+        if self.supabase_enabled:
+            metadata = None if complete else {'incomplete': True}
+            _run_in_background(self.db.save_conversation, user_id, message, final_response, metadata)
+    
+    def chat(self, message, history, user_id="anonymous"):
+        """Main chat function with RAG and tool calling"""
+        cached_response, messages, cache_key = self._prepare_chat(message, history, user_id)
+        if cached_response is not None:
+            return cached_response
+
         # Multi-turn tool calling loop
+        used_tools = False
         done = False
         while not done:
             response = self.openai.chat.completions.create(
-                model="gpt-4o-mini",
+                model=CHAT_MODEL,
                 messages=messages,
-                tools=self._get_tools()
+                tools=self._TOOLS
             )
 
             if response.choices[0].finish_reason == "tool_calls":
                 message_obj = response.choices[0].message
                 tool_results = self._handle_tool_calls(message_obj.tool_calls, user_id)
+                used_tools = True
                 messages.append(message_obj)
                 messages.extend(tool_results)
             else:
                 done = True
 
         final_response = response.choices[0].message.content
-
-        # Store conversation in database (if Supabase enabled)
-        if self.supabase_enabled:
-            self.db.save_conversation(user_id, message, final_response)
-
+        self._finish_chat(message, final_response, user_id, cache_key, used_tools)
         return final_response
+    
+    def chat_stream(self, message, history, user_id="anonymous"):
+        """Like chat(), but yields the response text piece by piece as it is generated"""
+        cached_response, messages, cache_key = self._prepare_chat(message, history, user_id)
+        if cached_response is not None:
+            yield cached_response
+            return
+
+        # Multi-turn tool calling loop; tool call deltas are reassembled by index
+        used_tools = False
+        response_parts = []
+        complete = False
+        # try/finally so the turn is still saved if the client disconnects or the
+        # upstream stream fails mid-reply; only a complete reply may be cached
+        try:
+            while True:
+                stream = self.openai.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=messages,
+                    tools=self._TOOLS,
+                    stream=True
+                )
+
+                turn_parts = []
+                tool_calls = {}
+                finish_reason = None
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    delta = choice.delta
+                    if delta.content:
+                        turn_parts.append(delta.content)
+                        response_parts.append(delta.content)
+                        yield delta.content
+                    for tool_call in delta.tool_calls or []:
+                        call = tool_calls.setdefault(tool_call.index, {"id": "", "name": "", "arguments": ""})
+                        if tool_call.id:
+                            call["id"] = tool_call.id
+                        if tool_call.function:
+                            call["name"] += tool_call.function.name or ""
+                            call["arguments"] += tool_call.function.arguments or ""
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+
+                if finish_reason != "tool_calls":
+                    complete = True
+                    break
+
+                calls = [
+                    ChatCompletionMessageToolCall(
+                        id=call["id"],
+                        type="function",
+                        function=Function(name=call["name"], arguments=call["arguments"])
+                    )
+                    for _, call in sorted(tool_calls.items())
+                ]
+                tool_results = self._handle_tool_calls(calls, user_id)
+                used_tools = True
+                messages.append({
+                    "role": "assistant",
+                    "content": "".join(turn_parts) or None,
+                    "tool_calls": [call.model_dump() for call in calls]
+                })
+                messages.extend(tool_results)
+        finally:
+            if complete or response_parts:
+                self._finish_chat(message, "".join(response_parts), user_id, cache_key, used_tools, complete)
 
 
 # Initialize chatbot
@@ -393,12 +882,46 @@ def chat():
         }), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    try:
+        data = request.json
+        message = data.get('message', '')
+        history = data.get('history', [])
+        user_id = data.get('user_id', 'anonymous')
+    except Exception as e:
+        print(f"Error in chat stream endpoint: {e}")
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+    if not message:
+        return jsonify({'error': 'Message is required'}), 400
+
+    def events():
+        # Server-Sent Events: one JSON payload per "data:" line
+        try:
+            for piece in chatbot.chat_stream(message, history, user_id):
+                yield f"data: {orjson.dumps({'delta': piece}).decode()}\n\n"
+            yield f"data: {orjson.dumps({'done': True, 'success': True}).decode()}\n\n"
+        except Exception as e:
+            print(f"Error in chat stream: {e}")
+            yield f"data: {orjson.dumps({'error': str(e), 'success': False}).decode()}\n\n"
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
     return jsonify({'status': 'healthy'})
 
 
 if __name__ == '__main__':
-    # Use environment variable for port (Render uses PORT env var)
-    port = int(os.getenv('PORT', 5001))
-    app.run(debug=False, port=port, host='0.0.0.0')
\ No newline at end of file
+    # `--seed` only fills the vector database (gunicorn's on_starting hook runs it before workers fork)
+    chatbot.seed_vector_db()
+    if '--seed' not in sys.argv[1:]:
+        # Use environment variable for port (Render uses PORT env var)
+        port = int(os.getenv('PORT', 5001))
+        app.run(debug=False, port=port, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""Gunicorn settings for production (used by the Procfile)"""
+import os
+import subprocess
+import sys
+
+# Render provides the port via the PORT env var
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# gevent workers yield while waiting on OpenAI/Supabase, so a single worker
+# serves many concurrent chats instead of blocking for each round-trip.
+# The app is not preloaded: gevent has to patch sockets/ssl before the
+# OpenAI and Supabase clients are created, so each worker builds its own.
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+worker_connections = 100
+
+# Startup loads the resume and the vector index, which can take a while
+timeout = 120
+
+SEED_TIMEOUT = 300
+
+
+def on_starting(server):
+    """Seed the vector database once, before any worker boots"""
+    # Workers only read the vector database; seeding in each of them would race and
+    # insert the documents several times. It runs in a child process because importing
+    # the app here would create its clients in the master, before gevent patching.
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatbot_api.py")
+    try:
+        result = subprocess.run([sys.executable, app_path, "--seed"], timeout=SEED_TIMEOUT)
+        if result.returncode:
+            server.log.warning("Vector database seeding failed (exit code %s)", result.returncode)
+    except subprocess.TimeoutExpired:
+        server.log.warning("Vector database seeding timed out after %ss", SEED_TIMEOUT)
@@ -0,0 +1,32 @@
+-- HNSW index for document similarity search.
+-- The API ranks chunks against an in-memory copy of the embeddings and only
+-- falls back to match_documents when that copy can't be loaded; this keeps
+-- the fallback sublinear in the number of chunks instead of a full scan.
+
+create index if not exists documents_embedding_hnsw_idx
+    on documents using hnsw (embedding vector_cosine_ops)
+    with (m = 16, ef_construction = 64);
+
+-- Return type may differ from the previous definition, so replace it outright
+drop function if exists match_documents(vector, float, int);
+
+-- Ordering by the bare <=> distance (with a LIMIT) is what lets the planner use the index
+create function match_documents(
+    query_embedding vector(1536),
+    match_threshold float,
+    match_count int
+)
+returns table (id bigint, content text, metadata jsonb, similarity float)
+language sql stable
+set hnsw.ef_search = 40
+as $$
+    select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        1 - (documents.embedding <=> query_embedding) as similarity
+    from documents
+    where 1 - (documents.embedding <=> query_embedding) > match_threshold
+    order by documents.embedding <=> query_embedding
+    limit match_count;
+$$;